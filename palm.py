@@ -10,6 +10,7 @@ from typing import List
 from urllib.parse import urlencode
 import logging
 import requests
+from requests.adapters import HTTPAdapter
 from palm_utils import GivEnergyObj, SolcastObj, t_to_mins, t_to_hrs
 import palm_settings as stgs
 
@@ -61,6 +62,12 @@ PALM_VERSION = "v1.1.3b"
 # pylint: disable=logging-not-lazy
 # pylint: disable=consider-using-f-string
 
+# Persistent HTTP session for PVOutput, MiHome, Shelly, weather and CO2 requests. Connections
+# to each host are kept alive between calls rather than set up again every minor frame
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=4))
+SESSION.mount("http://", HTTPAdapter(pool_connections=8, pool_maxsize=4))
+
 class LoadObj:
     """Class for each controlled load."""
 
@@ -75,62 +82,78 @@ class LoadObj:
         self.ontime: int = 0  # Minutes since current switch on (+ve) or off (-ve)
         self.priority: int = 99  # Load priority order (0=highest)
         self.priority_change: bool = False  # Used to flag a change in priority
-        self.est_power: int = self.load_record["PwrLoad"]
-        self.early_start_mins: int = 540
-        self.late_start_mins: int = 540
-        self.finish_time_mins: int = 1040
+
+        # Configuration values used every minor frame, extracted once from load_record
+        self.device_name: str = self.load_record["DeviceName"]
+        self.device_type: str = self.load_record["DeviceType"]
+        self.device_id: str = self.load_record["DeviceID"]
+        self.min_on_time: int = self.load_record["MinOnTime"]
+        self.min_daily_target: int = self.load_record["MinDailyTarget"]
+        self.max_daily_target: int = self.load_record["MaxDailyTarget"]
+        self.max_co2: int = self.load_record["MaxCO2"]
+        self.min_batt_soc: int = self.load_record["MinBattSoc"]
+        self.max_temp: float = self.load_record["MaxTemp"]
+        self.pwr_load: int = self.load_record["PwrLoad"]
+        self.hysteresis: int = self.load_record["Hysteresis"]
+
+        self.est_power: int = self.pwr_load
+
+        # Fixed times are converted once here, Sunrise / Sunset keywords by parse_sr_ss()
+        self.early_start_mins: int = t_to_mins(self.load_record["EarlyStart"])
+        self.late_start_mins: int = t_to_mins(self.load_record["LateStart"])
+        self.finish_time_mins: int = t_to_mins(self.load_record["FinishTime"])
 
         self.parse_sr_ss()
 
     def parse_sr_ss(self):
         """Substitutes Sunrise / Sunset keywords with actual values."""
 
-        def lookup_time_mins(in_time: str) -> int:
-            """Time keyword lookup routine."""
+        def lookup_time_mins(in_time: str, time_mins: int) -> int:
+            """Time keyword lookup routine. Fixed times keep their existing value"""
             if in_time == "Sunrise":
-                out_time = env_obj.sr_time
-            elif in_time == "Sunset":
-                out_time = env_obj.ss_time
-            elif in_time == "VSunrise":
-                out_time = env_obj.virt_sr_time
-            elif in_time == "VSunset":
-                out_time = env_obj.virt_ss_time
-            else:
-                out_time = in_time
-            out_time_mins = t_to_mins(out_time)
-            return out_time_mins
-
-        self.early_start_mins = lookup_time_mins(self.load_record["EarlyStart"])
-        self.late_start_mins = lookup_time_mins(self.load_record["LateStart"])
-        self.finish_time_mins = lookup_time_mins(self.load_record["FinishTime"])
+                return env_obj.sr_mins
+            if in_time == "Sunset":
+                return env_obj.ss_mins
+            if in_time == "VSunrise":
+                return env_obj.virt_sr_mins
+            if in_time == "VSunset":
+                return env_obj.virt_ss_mins
+            return time_mins
+
+        self.early_start_mins = lookup_time_mins(self.load_record["EarlyStart"],
+            self.early_start_mins)
+        self.late_start_mins = lookup_time_mins(self.load_record["LateStart"],
+            self.late_start_mins)
+        self.finish_time_mins = lookup_time_mins(self.load_record["FinishTime"],
+            self.finish_time_mins)
 
     def toggle(self, cmd: str) -> float:
         """Command to turn load on or off and return resultant forecast power change."""
 
         if cmd == "ON" and self.prev_state == "OFF":
             if not stgs.pg.test_mode:
-                if self.load_record["DeviceType"] == "MiHome":
-                    set_mihome_switch(self.load_record["DeviceID"], True)
-                elif self.load_record["DeviceType"] == "Shelly":
-                    set_shelly_switch(self.load_record["DeviceID"], True)
-            logger.info("Device ON event: "+ str(self.load_record["DeviceID"])+ " ETI: "+
-                        str(self.eti)+ " Name: "+ str(self.load_record["DeviceName"]))
+                if self.device_type == "MiHome":
+                    set_mihome_switch(self.device_id, True)
+                elif self.device_type == "Shelly":
+                    set_shelly_switch(self.device_id, True)
+            logger.info("Device ON event: "+ str(self.device_id)+ " ETI: "+
+                        str(self.eti)+ " Name: "+ str(self.device_name))
             self.curr_state = "ON"
-            self.est_power = self.load_record["PwrLoad"] - self.load_record["Hysteresis"]
+            self.est_power = self.pwr_load - self.hysteresis
             self.eti += 1
             self.ontime = 0  # Reset ontime whenever load toggles state
             return self.est_power
 
         if cmd == "OFF" and self.prev_state == "ON":
             if not stgs.pg.test_mode:
-                if self.load_record["DeviceType"] == "MiHome":
-                    set_mihome_switch(self.load_record["DeviceID"], False)
-                elif self.load_record["DeviceType"] == "Shelly":
-                    set_shelly_switch(self.load_record["DeviceID"], False)
-            logger.info("Device OFF event: "+ str(self.load_record["DeviceID"])+ " ETI: "+
-                        str(self.eti)+ " Name: "+ str(self.load_record["DeviceName"]))
+                if self.device_type == "MiHome":
+                    set_mihome_switch(self.device_id, False)
+                elif self.device_type == "Shelly":
+                    set_shelly_switch(self.device_id, False)
+            logger.info("Device OFF event: "+ str(self.device_id)+ " ETI: "+
+                        str(self.eti)+ " Name: "+ str(self.device_name))
             self.curr_state = "OFF"
-            self.est_power = self.load_record["PwrLoad"]
+            self.est_power = self.pwr_load
             self.ontime = -1  # Start counting down in negative numbers
             return self.est_power
 
@@ -164,10 +187,10 @@ class LoadObj:
 
         # Force a start if load has timed-out with run time below its daily target
         late_start_active = (self.late_start_mins < stgs.pg.t_now_mins and
-            self.eti < self.load_record["MinDailyTarget"])
+            self.eti < self.min_daily_target)
 
         # Detect if load has just been turned on and still needs to achieve its minimum on time
-        just_on = self.curr_state == "ON" and self.ontime < self.load_record["MinOnTime"]
+        just_on = self.curr_state == "ON" and self.ontime < self.min_on_time
 
         # Set priority for load, based on above variables and environmental conditions
         old_priority = self.priority
@@ -175,12 +198,12 @@ class LoadObj:
             self.priority = 0
         elif not valid_time or min_off_time < self.ontime < 0:  # Lowest priority: do not turn on
             self.priority = 99
-        elif (env_obj.co2_intensity > self.load_record['MaxCO2'] or
-            env_obj.temp_deg_c > self.load_record['MaxTemp'] or
-            self.eti >= self.load_record["MaxDailyTarget"] or
-            inverter.soc < self.load_record["MinBattSoc"]):
+        elif (env_obj.co2_intensity > self.max_co2 or
+            env_obj.temp_deg_c > self.max_temp or
+            self.eti >= self.max_daily_target or
+            inverter.soc < self.min_batt_soc):
             self.priority = 99
-        elif self.eti > self.load_record["MinDailyTarget"]:
+        elif self.eti > self.min_daily_target:
             self.priority = int(self.base_priority) + 50
         else:
             self.priority = int(self.base_priority)
@@ -198,11 +221,13 @@ class EnvObj:
         self.weather: [str] = []
         self.weather_symbol: str = "0"
         self.current_weather: [str] = []
+        self.weather_validators: dict = {}  # ETag/Last-Modified of latest weather download
         self.sunshine: int = 0
-        self.sr_time: str = "06:00"
-        self.virt_sr_time: str = "09:00"
-        self.ss_time: str = "21:00"
-        self.virt_ss_time: str = "21:00"
+        # Sunrise / sunset and virtual (detected) sunrise / sunset, as minutes after midnight
+        self.sr_mins: int = t_to_mins("06:00")
+        self.virt_sr_mins: int = t_to_mins("09:00")
+        self.ss_mins: int = t_to_mins("21:00")
+        self.virt_ss_mins: int = t_to_mins("21:00")
 
     def update_co2(self):
         """Import latest CO2 intensity data."""
@@ -215,7 +240,7 @@ class EnvObj:
         }
 
         try:
-            resp = requests.get(url, params={}, headers=headers, timeout=10)
+            resp = SESSION.get(url, params={}, headers=headers, timeout=10)
             resp.raise_for_status()
         except requests.exceptions.RequestException as error:
             logger.warning("Warning: Problem obtaining CO2 intensity: "+ str(error))
@@ -226,7 +251,7 @@ class EnvObj:
             return
 
         co2_intens_raw: int = []
-        co2_intens_raw = json.loads(resp.content.decode('utf-8'))['data']['data']
+        co2_intens_raw = json.loads(resp.content)['data']['data']
 
         self.co2_intensity = co2_intens_raw[0]['intensity']['forecast']
 
@@ -257,36 +282,36 @@ class EnvObj:
 
         new_virt_sr_ss = False
         pwr_threshold = stgs.PVData.PwrThreshold
-        if stgs.pg.t_now_mins < t_to_mins(env_obj.virt_sr_time):  # Gen started?
+        if stgs.pg.t_now_mins < env_obj.virt_sr_mins:  # Gen started?
             if (inverter.sys_status[1]['solar']['power'] < pwr_threshold <
                 inverter.sys_status[0]['solar']['power']):
                 new_virt_sr_ss = True
-                self.virt_sr_time = inverter.sys_status[0]['time'][11:]
+                self.virt_sr_mins = t_to_mins(inverter.sys_status[0]['time'][11:])
                 logger.info("VSunrise/set (Sunrise detected) VSR: " +
-                      str(env_obj.virt_sr_time)+ " VSS: "+ str(env_obj.virt_ss_time))
+                      t_to_hrs(env_obj.virt_sr_mins)+ " VSS: "+ t_to_hrs(env_obj.virt_ss_mins))
         elif stgs.pg.t_now_mins > 900:  # It's afternoon, gen ended?
             if (inverter.sys_status[0]['solar']['power'] < pwr_threshold and
                 (pwr_threshold < inverter.sys_status[1]['solar']['power'] or stgs.pg.loop_counter < 10)):
                 new_virt_sr_ss = True
-                self.virt_ss_time = inverter.sys_status[0]['time'][11:]
+                self.virt_ss_mins = t_to_mins(inverter.sys_status[0]['time'][11:])
                 logger.info("VSunrise/set (Sunset detected) VSR: " +
-                      str(env_obj.virt_sr_time)+ " VSS: "+ str(env_obj.virt_ss_time))
+                      t_to_hrs(env_obj.virt_sr_mins)+ " VSS: "+ t_to_hrs(env_obj.virt_ss_mins))
             elif (inverter.sys_status[0]['solar']['power'] > 2 * pwr_threshold >
                 inverter.sys_status[1]['solar']['power']):
                 # False alarm - sun back up (added hysteresis to threshold)
                 new_virt_sr_ss = True
-                self.virt_ss_time = env_obj.ss_time
+                self.virt_ss_mins = env_obj.ss_mins
                 logger.info('VSunrise/set (False alarm) VSR:' +
-                      str(env_obj.virt_sr_time)+ " VSS:"+ str(env_obj.virt_ss_time))
+                      t_to_hrs(env_obj.virt_sr_mins)+ " VSS:"+ t_to_hrs(env_obj.virt_ss_mins))
         return new_virt_sr_ss
 
     def reset_sr_ss(self):
         """Reset sunrise & sunset each day."""
 
-        self.sr_time: str = "06:00"
-        self.virt_sr_time: str = "09:00"
-        self.ss_time: str = "21:30"
-        self.virt_ss_time: str = "21:30"
+        self.sr_mins = t_to_mins("06:00")
+        self.virt_sr_mins = t_to_mins("09:00")
+        self.ss_mins = t_to_mins("21:30")
+        self.virt_ss_mins = t_to_mins("21:30")
 
     def update_weather_curr(self):
         """Download latest weather from OpenWeatherMap."""
@@ -295,26 +320,57 @@ class EnvObj:
         payload = stgs.OpenWeatherMap.payload
 
         try:
-            resp = requests.get(url, params=payload, timeout=5)
+            resp = SESSION.get(url, params=payload, headers=self.weather_validators, timeout=5)
             resp.raise_for_status()
         except requests.exceptions.RequestException as error:
             logger.error(error)
             return
 
+        if resp.status_code == 304 and self.current_weather:
+            logger.debug("Weather data unchanged")
+            return
+
         if len(resp.content) < 50:
             logger.warning("Warning: Weather data missing/short")
             logger.warning(resp.content)
             return
 
-        current_weather = json.loads(resp.content.decode('utf-8'))
+        current_weather = json.loads(resp.content)
         logger.debug(str(current_weather))
         self.current_weather = current_weather
 
+        # Send validators with the next request so that unchanged data is not downloaded again
+        self.weather_validators = {}
+        if 'ETag' in resp.headers:
+            self.weather_validators['If-None-Match'] = resp.headers['ETag']
+        if 'Last-Modified' in resp.headers:
+            self.weather_validators['If-Modified-Since'] = resp.headers['Last-Modified']
+
         self.temp_deg_c = round(current_weather['current']['temp'] - 273, 1)
         self.weather_symbol = current_weather['current']['weather'][0]['id']
 
 # End of EnvObj() class definition
 
+# Start time of the latest request to each rate-limited service. Shared by worker threads
+LAST_REQUEST: dict = {}
+LAST_REQUEST_LOCK = threading.Lock()
+
+def rate_limit(service: str, interval: float):
+    """Waits until interval (secs) has elapsed since the previous request to the service."""
+
+    with LAST_REQUEST_LOCK:
+        time_now = time.monotonic()
+        next_slot = time_now
+        if service in LAST_REQUEST:
+            next_slot = max(time_now, LAST_REQUEST[service] + interval)
+        LAST_REQUEST[service] = next_slot
+
+    if next_slot > time_now:
+        time.sleep(next_slot - time_now)
+
+#  End of rate_limit()
+
+
 def set_mihome_switch(device_id: str, turn_on: bool) -> bool:
     """Operates a MiHome switch on/off."""
 
@@ -331,17 +387,17 @@ def set_mihome_switch(device_id: str, turn_on: bool) -> bool:
         "id" : int(device_id),
     }
 
-    # Delay to avoid dropped commands at MiHome server and interference between base stations
-    time.sleep(5)
+    # Spacing to avoid dropped commands at MiHome server and interference between base stations
+    rate_limit("MiHome", 5)
 
     try:
-        resp = requests.put(url, auth=(user_id, api_key), json=payload, timeout=5)
+        resp = SESSION.put(url, auth=(user_id, api_key), json=payload, timeout=5)
         resp.raise_for_status()
     except requests.exceptions.RequestException as error:
         logger.error(str(error))
         return False
 
-    parsed = json.loads(resp.content.decode('utf-8'))
+    parsed = resp.json()
     if parsed['status'] == "success":
         return True
     logger.warning("Failure..."+ url + device_id)
@@ -361,7 +417,7 @@ def set_shelly_switch(base_url: str, turn_on: bool) -> bool:
     url:str = base_url + "relay/0/?turn=" + sw_cmd
 
     try:
-        resp = requests.put(url, timeout=5)
+        resp = SESSION.put(url, timeout=5)
         resp.raise_for_status()
     except requests.exceptions.RequestException as error:
         logger.error(str(error))
@@ -378,13 +434,13 @@ def read_shelly_switch(base_url: str) -> str:
     url:str = str(base_url) + "rpc/Input.GetStatus?id=0"
 
     try:
-        resp = requests.get(url, timeout=5)
+        resp = SESSION.get(url, timeout=5)
         resp.raise_for_status()
     except requests.exceptions.RequestException as error:
         logger.error("Missing response from Shelly EM: "+ str(error))
         return "Error"
 
-    parsed = json.loads(resp.content.decode('utf-8'))
+    parsed = json.loads(resp.content)
     logger.debug(str(parsed))
 
     if parsed['state'] is True:
@@ -413,13 +469,13 @@ class EVObj:
             return False
 
         try:
-            resp = requests.put(url, timeout=5)
+            resp = SESSION.put(url, timeout=5)
             resp.raise_for_status()
         except requests.exceptions.RequestException as error:
             logger.error("Missing response from Shelly EM"+ str(error))
             return False
 
-        parsed = json.loads(resp.content.decode('utf-8'))
+        parsed = json.loads(resp.content)
         logger.debug(str(parsed))
 
         if parsed['is_valid'] is True:
@@ -436,6 +492,14 @@ class EVObj:
 # End of EVObj
 
 
+def no_quote(string: str, *_) -> str:
+    """Pass-through quoter for urlencode, PVOutput payloads must not escape ":"."""
+
+    return string
+
+#  End of no_quote()
+
+
 def put_pv_output():
     """Upload generation/consumption data to PVOutput.org."""
 
@@ -477,14 +541,18 @@ def put_pv_output():
         "v12" : inverter.soc
     }
 
+    if PVO_BATCH_SIZE > 1:  # Buffer data and upload several records at once
+        put_pv_output_batch(post_date, post_time, part_payload)
+        return()
+
     payload.update(part_payload)  # Concatenate the data, don't escape ":"
-    payload = urlencode(payload, doseq=True, quote_via=lambda x,y,z,w: x)
+    payload = urlencode(payload, doseq=True, quote_via=no_quote)
 
-    time.sleep(2)  # PVOutput has a 1 second rate limit. Avoid any clashes
+    rate_limit("PVOutput", 2)  # PVOutput has a 1 second rate limit. Avoid any clashes
 
     if not stgs.pg.test_mode:
         try:
-            resp = requests.get(url, params=payload, timeout=10)
+            resp = SESSION.get(url, params=payload, timeout=10)
             resp.raise_for_status()
         except requests.exceptions.RequestException as error:
             logger.warning("PVOutput Write Error "+ stgs.pg.long_t_now)
@@ -497,6 +565,59 @@ def put_pv_output():
 #  End of put_pv_output()
 
 
+# Status records waiting to be uploaded to PVOutput.org. Shared by worker threads
+PVO_BATCH: List[str] = []
+PVO_BATCH_LOCK = threading.Lock()
+
+# Records per upload. Settings files from before batching was added don't define batch_size
+PVO_BATCH_SIZE: int = getattr(stgs.PVOutput, "batch_size", 1)
+
+def put_pv_output_batch(post_date: str, post_time: str, part_payload: dict):
+    """Buffer a status record and upload full batches to PVOutput.org."""
+
+    url = stgs.PVOutput.url + "addbatchstatus.jsp"
+    key = stgs.PVOutput.key
+    sid = stgs.PVOutput.sid
+
+    # Batch field order is date, time, v1 to v12. v3 is left blank, as for single status
+    record = ",".join([post_date, post_time] +
+        [str(part_payload.get("v"+ str(i), "")) for i in range(1, 13)])
+
+    with PVO_BATCH_LOCK:
+        PVO_BATCH.append(record)
+        del PVO_BATCH[:-30]  # PVOutput accepts up to 30 records per batch
+        if len(PVO_BATCH) < min(PVO_BATCH_SIZE, 30):
+            logger.info("Data; Buffer for pvoutput.org; "+ record)
+            return
+        batch = list(PVO_BATCH)
+        PVO_BATCH.clear()
+
+    payload = {
+        "key" : key,
+        "sid" : sid,
+        "data": ";".join(batch)
+    }
+    payload = urlencode(payload, doseq=True, quote_via=no_quote)
+
+    rate_limit("PVOutput", 2)  # PVOutput has a 1 second rate limit. Avoid any clashes
+
+    if not stgs.pg.test_mode:
+        try:
+            resp = SESSION.get(url, params=payload, timeout=10)
+            resp.raise_for_status()
+        except requests.exceptions.RequestException as error:
+            logger.warning("PVOutput Batch Write Error "+ stgs.pg.long_t_now)
+            logger.warning(error)
+            with PVO_BATCH_LOCK:  # Keep records for the next attempt
+                PVO_BATCH[:0] = batch
+                del PVO_BATCH[:-30]
+            return
+
+    logger.info("Data; Batch write to pvoutput.org; "+ str(len(batch))+ " records; "+ record)
+
+#  End of put_pv_output_batch()
+
+
 def resummarise_pv_output(post_date: str):
     """Calculate and upload summary of generation/consumption data to PVOutput.org."""
 
@@ -513,10 +634,10 @@ def resummarise_pv_output(post_date: str):
         "dt"  : post_date
     }
 
-    payload = urlencode(payload, doseq=True, quote_via=lambda x,y,z,w: x)
+    payload = urlencode(payload, doseq=True, quote_via=no_quote)
 
     try:
-        resp = requests.get(url, params=payload, timeout=10)
+        resp = SESSION.get(url, params=payload, timeout=10)
         resp.raise_for_status()
     except requests.exceptions.RequestException as error:
         logger.warning("PVOutput Read Error "+ stgs.pg.long_t_now)
@@ -549,10 +670,10 @@ def resummarise_pv_output(post_date: str):
         "d"   : post_date
     }
 
-    payload = urlencode(payload, doseq=True, quote_via=lambda x,y,z,w: x)
+    payload = urlencode(payload, doseq=True, quote_via=no_quote)
 
     try:
-        resp = requests.get(url, params=payload, timeout=10)
+        resp = SESSION.get(url, params=payload, timeout=10)
         resp.raise_for_status()
     except requests.exceptions.RequestException as error:
         logger.warning("PVOutput Read Error "+ stgs.pg.long_t_now)
@@ -619,13 +740,13 @@ def resummarise_pv_output(post_date: str):
     }
 
     payload.update(part_payload)  # Concatenate the data, don't escape ":"
-    payload = urlencode(payload, doseq=True, quote_via=lambda x,y,z,w: x)
+    payload = urlencode(payload, doseq=True, quote_via=no_quote)
 
-    time.sleep(2)  # PVOutput has a 1 second rate limit. Avoid any clashes
+    rate_limit("PVOutput", 2)  # PVOutput has a 1 second rate limit. Avoid any clashes
 
     if not stgs.pg.test_mode:
         try:
-            resp = requests.get(url, params=payload, timeout=10)
+            resp = SESSION.get(url, params=payload, timeout=10)
             resp.raise_for_status()
         except requests.exceptions.RequestException as error:
             logger.warning("PVOutput Write Error "+ stgs.pg.long_t_now)
@@ -659,24 +780,32 @@ def balance_loads():
             unique_load.curr_state == "ON"):  # Active low-priority loads are up for grabs
             net_usage_est -= unique_load.est_power
 
+    # Priorities are fixed for the remaining passes, so take a snapshot and rank load indices
+    # once. Sorting is stable so equal priorities keep their config order
+    priority = [unique_load.priority for unique_load in load_obj]
+    ranked = sorted(range(len(load_obj)), key=priority.__getitem__)
+    batt_soc = inverter.soc
+
     # Second pass: if possible, turn on new loads, highest priority first
-    for priority in range(1, 90):
-        for unique_load in load_obj:
-            if (unique_load.priority == priority and
-                unique_load.curr_state == "OFF" and
-                net_usage_est * -1 >= unique_load.est_power and
-                net_usage_est < 0 and inverter.soc > 98):  # Capacity exists, turn on load
+    for index in ranked:
+        if not (net_usage_est < 0 and batt_soc > 98):  # No spare capacity left
+            break
+        unique_load = load_obj[index]
+        if (1 <= priority[index] < 90 and
+            unique_load.curr_state == "OFF" and
+            net_usage_est * -1 >= unique_load.est_power):  # Capacity exists, turn on load
 
-                net_usage_est += unique_load.toggle("ON")
+            net_usage_est += unique_load.toggle("ON")
 
     # Third pass: Turn off loads to rebalance power, lowest priority first
-    for priority in range(90, 1, -1):
-        for unique_load in load_obj:
-            if (unique_load.priority == priority and
-                unique_load.curr_state == "ON" and
-                (net_usage_est > 0 or inverter.soc < 95)):  # Turn off load
+    for index in sorted(range(len(load_obj)), key=lambda index: -priority[index]):
+        if not (net_usage_est > 0 or batt_soc < 95):  # Nothing left to rebalance
+            break
+        unique_load = load_obj[index]
+        if (1 < priority[index] <= 90 and
+            unique_load.curr_state == "ON"):  # Turn off load
 
-                net_usage_est -= unique_load.toggle("OFF")
+            net_usage_est -= unique_load.toggle("OFF")
 
 #  End of balance_loads()
 
@@ -699,6 +828,13 @@ class EventsObj:
         self.update_carbon_intensity: bool = False
         self.update_weather: bool = False
 
+        # Settings times are fixed, convert them once rather than every minute
+        self.start_mins: int = t_to_mins(stgs.GE.start_time)
+        self.end_mins: int = t_to_mins(stgs.GE.end_time)
+        self.end_winter_mins: int = t_to_mins(stgs.GE.end_time_winter)
+        self.boost_start_mins: int = t_to_mins(stgs.GE.boost_start)
+        self.boost_finish_mins: int = t_to_mins(stgs.GE.boost_finish)
+
     def update(self):
         """Values are updated every minute for use by logic in main code loop"""
         t_now = stgs.pg.t_now_mins
@@ -709,40 +845,40 @@ class EventsObj:
 
         if stgs.GE.start_time != "" and stgs.GE.end_time != "":
             # Is current time is within off-peak window? Needs to consider spanning midnight
-            self.off_pk_start = t_to_mins(stgs.GE.start_time) == t_now
-            self.off_pk = t_to_mins(stgs.GE.start_time) < t_now < t_to_mins(stgs.GE.end_time) or \
-                t_now > t_to_mins(stgs.GE.start_time) > t_to_mins(stgs.GE.end_time) or \
-                t_to_mins(stgs.GE.start_time) > t_to_mins(stgs.GE.end_time) > t_now
+            self.off_pk_start = self.start_mins == t_now
+            self.off_pk = self.start_mins < t_now < self.end_mins or \
+                t_now > self.start_mins > self.end_mins or \
+                self.start_mins > self.end_mins > t_now
 
             # 5 minutes before off-peak start and 1hr before off-peak ends
             self.update_pv_fcast = \
                 ((stgs.pg.test_mode or stgs.pg.once_mode) and stgs.pg.loop_counter == 1) or \
-                t_now == (t_to_mins(stgs.GE.start_time) + 1435) % 1440 or \
-                t_now == (t_to_mins(stgs.GE.end_time) + 1375) % 1440
+                t_now == (self.start_mins + 1435) % 1440 or \
+                t_now == (self.end_mins + 1375) % 1440
 
             # 2 minutes before off-peak start for setting overnight battery charging target
             # Repeat 60 mins before end of off-peak in case of Solcast fine-tuning
             self.update_soc = \
                 ((stgs.pg.test_mode or stgs.pg.once_mode) and stgs.pg.loop_counter == 2) or \
-                t_now == (t_to_mins(stgs.GE.start_time) + 1438) % 1440 or \
-                t_now == (t_to_mins(stgs.GE.end_time) + 1380) % 1440
+                t_now == (self.start_mins + 1438) % 1440 or \
+                t_now == (self.end_mins + 1380) % 1440
 
         if stgs.GE.end_time != "" and stgs.GE.end_time_winter != "":
             # Flag 1 hour before end of off-peak
             self.off_pk_ending = self.winter is True and \
-                t_plus_hr == t_to_mins(stgs.GE.end_time_winter) or \
-                self.winter is False and t_plus_hr == t_to_mins(stgs.GE.end_time)
+                t_plus_hr == self.end_winter_mins or \
+                self.winter is False and t_plus_hr == self.end_mins
             # Flag at end of off-peak
             self.off_pk_end = \
-                self.winter is True and t_now == t_to_mins(stgs.GE.end_time_winter) or \
-                self.winter is False and t_now == t_to_mins(stgs.GE.end_time)
+                self.winter is True and t_now == self.end_winter_mins or \
+                self.winter is False and t_now == self.end_mins
 
         # Afternoon boost options
         if stgs.GE.boost_start != "" and stgs.GE.boost_finish != "":
             self.pm_boost_start = self.winter is True or self.shoulder is True and \
-                t_now == t_to_mins(stgs.GE.boost_start)
+                t_now == self.boost_start_mins
             self.pm_boost_end = self.winter is True or self.shoulder is True and \
-                t_now == t_to_mins(stgs.GE.boost_finish)
+                t_now == self.boost_finish_mins
 
         # Summarise daily data at PVOutput.org
         self.resumm_pvoutput = stgs.PVOutput.enable is True and \
@@ -792,12 +928,16 @@ if __name__ == '__main__':
 
     EV_ACTIVE_VAR: bool = False
 
+    # Load balancing runs in the background. Kept so that a new run is not started over a slow one
+    do_balance_loads = None
+
     while True:  # Main Loop
-        # Current time definitions
-        stgs.pg.long_t_now: str = time.strftime("%d-%m-%Y %H:%M:%S %z", time.localtime())
+        # Current time definitions, taken from a single clock read per frame
+        LOCAL_TIME_VAR = time.localtime()
+        stgs.pg.long_t_now: str = time.strftime("%d-%m-%Y %H:%M:%S %z", LOCAL_TIME_VAR)
         stgs.pg.month: str = stgs.pg.long_t_now[3:5]
         stgs.pg.t_now: str = stgs.pg.long_t_now[11:]
-        stgs.pg.t_now_mins: int = t_to_mins(stgs.pg.t_now)
+        stgs.pg.t_now_mins: int = LOCAL_TIME_VAR.tm_hour * 60 + LOCAL_TIME_VAR.tm_min
 
         if stgs.pg.loop_counter == 0:  # Initialise
             logger.critical("Initialising at: "+ stgs.pg.long_t_now)
@@ -863,12 +1003,8 @@ if __name__ == '__main__':
                     logger.error("Warning; unable to set SoC")
 
                 # Send plot data to logfile in CSV format
-                logger.info("SoC Chart Data - Start. Paste these lines into a spreadsheet for a plot of SoC")
-                i = 0
-                while i < 5:
-                    logger.info(inverter.plot[i])
-                    i += 1
-                logger.info("SoC Chart Data - End")
+                logger.info("SoC Chart Data - Start. Paste these lines into a spreadsheet for a plot of SoC\n"+
+                    "\n".join(map(str, inverter.plot[0:5]))+ "\nSoC Chart Data - End")
 
                 # if running in once mode, quit after inverter SoC update
                 if stgs.pg.once_mode:
@@ -919,13 +1055,13 @@ if __name__ == '__main__':
 
                 # Update carbon intensity every 15 mins as background task
                 if events.update_carbon_intensity is True:
-                    do_get_carbon_intensity = threading.Thread(target=env_obj.update_co2())
+                    do_get_carbon_intensity = threading.Thread(target=env_obj.update_co2)
                     do_get_carbon_intensity.daemon = True
                     do_get_carbon_intensity.start()
 
                 # Update weather every 15 mins as background task
                 if events.update_weather is True:
-                    do_get_weather = threading.Thread(target=env_obj.update_weather_curr())
+                    do_get_weather = threading.Thread(target=env_obj.update_weather_curr)
                     do_get_weather.daemon = True
                     do_get_weather.start()
 
@@ -950,16 +1086,19 @@ if __name__ == '__main__':
                     do_put_pv_output.daemon = True
                     do_put_pv_output.start()
 
-                #  Turn loads on or off. Check every minute
+                #  Turn loads on or off. Check every minute, unless last check is still running
                 if stgs.LoadMgt.enable is True:
-                    do_balance_loads = threading.Thread(target=balance_loads())
-                    do_balance_loads.daemon = True
-                    do_balance_loads.start()
+                    if do_balance_loads is not None and do_balance_loads.is_alive():
+                        logger.warning("Warning; Load balancing still running, check skipped")
+                    else:
+                        do_balance_loads = threading.Thread(target=balance_loads)
+                        do_balance_loads.daemon = True
+                        do_balance_loads.start()
 
                 # Update PVOutput daily summary to reflect any IO Smart charging
                 if events.resumm_pvoutput:
-                    do_resumm_pv_output = threading.Thread(target=\
-                        resummarise_pv_output(time.strftime("%Y%m%d", time.localtime())))
+                    do_resumm_pv_output = threading.Thread(target=resummarise_pv_output,
+                        args=(time.strftime("%Y%m%d", time.localtime()),))
                     do_resumm_pv_output.daemon = True
                     do_resumm_pv_output.start()
 
@@ -971,8 +1110,8 @@ if __name__ == '__main__':
         if stgs.pg.test_mode or stgs.pg.once_mode:  # Wait 5 seconds
             time.sleep(5)
         else:  # Sync to minute rollover on system clock
-            CURRENT_MINUTE = int(time.strftime("%M", time.localtime()))
-            while int(time.strftime("%M", time.localtime())) == CURRENT_MINUTE:
+            CURRENT_MINUTE = time.localtime().tm_min
+            while time.localtime().tm_min == CURRENT_MINUTE:
                 time.sleep(10)
 
         sys.stdout.flush()
@@ -41,6 +41,8 @@ class PVOutput:
     url= "https://pvoutput.org/service/r2/"
     key = "xxxx"
     sid = "xxxx"
+    # Status records per upload. 1 = live update every 5 minutes, 2 to 30 = buffered batch upload
+    batch_size = 1
 
 # API for obtaining current UK carbon intensity of electricity generation
 class CarbonIntensity:
@@ -1,17 +1,22 @@
 #!/usr/bin/env python3
 """PALM - PV Active Load Manager."""
 
+import fcntl
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
 import palm_settings as stgs
-from palm_utils import GivEnergyObj, SolcastObj, t_to_mins
+from palm_utils import GivEnergyObj, SolcastObj
 
 # Debug switch (if True) is used to run palm_Soc outside the HA environment for test purpses
 DEBUG_SW = False
 if DEBUG_SW:
     import logging
-    import time
 else:
-    import write as wr  # pylint: disable=import-error
-    from GivLUT import GivLUT, GivQueue  # pylint: disable=import-error
+    from GivLUT import GivLUT  # pylint: disable=import-error
 
 # This software in any form is covered by the following Open Source BSD license:
 #
@@ -53,34 +58,136 @@ PALM_VERSION = "v1.1.0SoC"
 # -*- coding: utf-8 -*-
 # pylint: disable=logging-not-lazy
 
+# Solcast forecasts refresh every 30 minutes and the free tier is rate-limited, so keep the
+# parsed forecast between runs. Set PALM_FORCE_REFRESH=1 to ignore the cache
+SOLCAST_CACHE = "/tmp/palm_solcast_cache.json"
+SOLCAST_CACHE_TTL = 1800
+SOLCAST_ARRAYS = ("pv_est10_day", "pv_est50_day", "pv_est90_day",
+    "pv_est10_30", "pv_est50_30", "pv_est90_30")
+
+# Result of the latest SoC calculation. A restart within the same half-hour reuses it
+SOC_STATE = "/tmp/palm_soc_state.json"
+
+# Inverter writes are dispatched here so that the caller does not wait for GivTCP
+WRITE_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+
+
+def read_solcast_cache(forecast: SolcastObj) -> bool:
+    """Load PV forecast from disk cache. Returns False if missing or stale"""
+
+    if os.environ.get("PALM_FORCE_REFRESH", "") != "":
+        return False
+    try:
+        if time.time() - os.path.getmtime(SOLCAST_CACHE) >= SOLCAST_CACHE_TTL:
+            return False
+        with open(SOLCAST_CACHE, "r", encoding="utf-8") as cache_file:
+            cache = json.load(cache_file)
+        # Forecast arrays are indexed from today, so a cache from yesterday is stale. From the
+        # afternoon they start at tomorrow instead, so a cache from the morning is also stale
+        if cache['date'] != time.strftime("%Y-%m-%d", time.localtime()) or \
+            cache['offset'] != SolcastObj.current_offset():
+            return False
+        for name in SOLCAST_ARRAYS:
+            setattr(forecast, name, cache[name])
+    except (OSError, ValueError, KeyError):
+        return False
+
+    logger.info("Using cached Solcast forecast from "+ cache['timestamp'])
+    return True
+
+
+def write_solcast_cache(forecast: SolcastObj):
+    """Save PV forecast to disk cache"""
+
+    cache = {'date': time.strftime("%Y-%m-%d", time.localtime()),
+        'timestamp': time.strftime("%H:%M:%S", time.localtime()), 'offset': forecast.offset}
+    for name in SOLCAST_ARRAYS:
+        cache[name] = getattr(forecast, name)
+    try:
+        with open(SOLCAST_CACHE, "w", encoding="utf-8") as cache_file:
+            json.dump(cache, cache_file)
+    except OSError as error:
+        logger.warning("Unable to write Solcast cache: "+ str(error))
+
+
+def update_pv_forecast(forecast: SolcastObj):
+    """Load PV forecast from disk cache if recent, otherwise download from Solcast"""
+
+    # Hold a lock from cache check to cache write, so that runs started together (e.g. from
+    # cron and by hand) make one download between them and never read a partial cache file
+    try:
+        lock_file = open(SOLCAST_CACHE + ".lock", "a", encoding="utf-8")  # pylint: disable=consider-using-with
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+    except OSError as error:
+        logger.warning("Unable to lock Solcast cache: "+ str(error))
+        lock_file = nullcontext()
+
+    with lock_file:
+        if not read_solcast_cache(forecast) and forecast.update():
+            write_solcast_cache(forecast)
+
+
+def load_soc_state(slot: str) -> str:
+    """Restore target SoC and plot if already calculated in this half-hour slot"""
+
+    if os.environ.get("PALM_FORCE_REFRESH", "") != "":
+        return ""
+    try:
+        with open(SOC_STATE, "r", encoding="utf-8") as state_file:
+            state = json.load(state_file)
+        if state['slot'] != slot:
+            return ""
+        inverter.tgt_soc = state['tgt_soc']
+        inverter.plot = state['plot']
+    except (OSError, ValueError, KeyError):
+        return ""
+
+    logger.info("Using target SoC calculated earlier in this half-hour: "+
+        str(inverter.tgt_soc)+ "%")
+    return state['cmd']
+
+
+def save_soc_state(slot: str, cmd: str):
+    """Store target SoC and plot for reuse by a restart in the same half-hour slot"""
+
+    state = {'slot': slot, 'cmd': cmd, 'tgt_soc': inverter.tgt_soc, 'plot': inverter.plot}
+    try:
+        with open(SOC_STATE, "w", encoding="utf-8") as state_file:
+            json.dump(state, state_file)
+    except OSError as error:
+        logger.warning("Unable to write SoC state: "+ str(error))
+
 
 def GivTCP_write_soc(cmd: str):
     """Write SoC target directly to GivEnergy inverter. Fallback to API write"""
 
     if cmd == "set_soc":  # Sets target SoC to value
-        try:
-            result={}
-            logger.debug("Setting Charge Target to: "+ str(inverter.tgt_soc)+ "%")
-            payload={}
-            payload['chargeToPercent']= inverter.tgt_soc
-            result=GivQueue.q.enqueue(wr.setChargeTarget,payload)
-            logger.debug(result)
-        except:
-            inverter.set_mode("set_soc")
-
+        charge_target = inverter.tgt_soc
     elif cmd == "set_soc_winter":  # Restore default overnight charge params
-        try:
-            result={}
-            logger.debug("Setting Charge Target to: 100%")
-            payload={}
-            payload['chargeToPercent']= 100
-            result=GivQueue.q.enqueue(wr.setChargeTarget,payload)
-            logger.debug(result)
-        except:
-            inverter.set_mode("set_soc_winter")
-
+        charge_target = 100
     else:
         logger.critical("direct_write: Command not recognised")
+        return
+
+    def queue_write():
+        """Queue the register write with GivTCP"""
+        # The GivTCP write stack is only loaded when a write is made. An import failure
+        # (e.g. running outside GivTCP) falls back to the API write like any other error
+        import write as wr  # pylint: disable=import-error,import-outside-toplevel
+        from GivLUT import GivQueue  # pylint: disable=import-error,import-outside-toplevel
+        payload = {}
+        payload['chargeToPercent'] = charge_target
+        return GivQueue.q.enqueue(wr.setChargeTarget, payload)
+
+    def write_done(result):
+        """Log result of queued write, or fall back to API write if it failed"""
+        if result.exception() is None:
+            logger.debug(result.result())
+        else:
+            inverter.set_mode(cmd)
+
+    logger.debug("Setting Charge Target to: "+ str(charge_target)+ "%")
+    WRITE_EXECUTOR.submit(queue_write).add_done_callback(write_done)
 
 
 if __name__ == '__main__':
@@ -91,11 +198,12 @@ if __name__ == '__main__':
     else:
         logger = GivLUT.logger
 
-    # Set time variables
-    stgs.pg.long_t_now: str = time.strftime("%d-%m-%Y %H:%M:%S %z", time.localtime())
-    stgs.pg.month: str = stgs.pg.long_t_now[3:5]
-    stgs.pg.t_now: str = stgs.pg.long_t_now[11:]
-    stgs.pg.t_now_mins: int = t_to_mins(stgs.pg.t_now)
+    # Set time variables from a single reading of the local time
+    TIME_NOW = datetime.now().astimezone()
+    stgs.pg.long_t_now: str = TIME_NOW.strftime("%d-%m-%Y %H:%M:%S %z")
+    stgs.pg.month: str = f"{TIME_NOW.month:02d}"
+    stgs.pg.t_now: str = f"{TIME_NOW.hour:02d}:{TIME_NOW.minute:02d}:{TIME_NOW.second:02d}"
+    stgs.pg.t_now_mins: int = TIME_NOW.hour * 60 + TIME_NOW.minute
 
     logger.info("PALM... PV Automated Load Manager: "+ str(PALM_VERSION))
     logger.info("Timestamp: "+ str(stgs.pg.long_t_now))
@@ -107,22 +215,30 @@ if __name__ == '__main__':
     pv_forecast: SolcastObj = SolcastObj()
     PV_WEIGHT = stgs.Solcast.weight
 
-    # Download inverter load history
-    inverter.get_load_hist()
+    # Skip downloads and calculation if already done in this half-hour slot
+    SOC_SLOT = stgs.pg.long_t_now[0:10]+ " "+ str(stgs.pg.t_now_mins // 30)
+    SOC_CMD = load_soc_state(SOC_SLOT)
+
+    if SOC_CMD == "":
+        # Download inverter load history
+        inverter.get_load_hist()
+
+        # Download and parse PV forecast (or reuse recent cached copy)
+        update_pv_forecast(pv_forecast)
+
+        # Compute target SoC
+        logger.info("Forecast weighting: "+ str(PV_WEIGHT))
+        SOC_CMD = inverter.compute_tgt_soc(pv_forecast, PV_WEIGHT, True)
 
-    # Download and parse PV forecast
-    pv_forecast.update()
+        # Don't keep the 100% fallback used when the forecast is missing, retry next run
+        if pv_forecast.pv_est50_day[0] > 0:
+            save_soc_state(SOC_SLOT, SOC_CMD)
 
-    # Compute target SoC and write directly to register in GivEnergy inverter
-    logger.info("Forecast weighting: "+ str(PV_WEIGHT))
-    GivTCP_write_soc(inverter.compute_tgt_soc(pv_forecast, PV_WEIGHT, True))
+    # Write directly to register in GivEnergy inverter
+    GivTCP_write_soc(SOC_CMD)
 
     # Send plot data to logfile in CSV format
-    logger.info("SoC Chart Data - Start")
-    i = 0
-    while i < 5:
-        logger.info(inverter.plot[i])
-        i += 1
-    logger.info("SoC Chart Data - End")
+    logger.info("SoC Chart Data - Start\n"+ "\n".join(map(str, inverter.plot[0:5]))+
+        "\nSoC Chart Data - End")
 
 # End of main
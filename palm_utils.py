@@ -3,11 +3,18 @@
 
 import time
 import json
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
 from datetime import datetime, timedelta
-from typing import Tuple, List
+from functools import lru_cache
+from typing import Deque, Tuple, List
 import logging
 ## import matplotlib.pyplot as plt
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import palm_settings as stgs
 
 logger = logging.getLogger(__name__)
@@ -57,6 +64,16 @@ PALM_VERSION = "v1.1.1"
 # pylint: disable=logging-not-lazy
 # pylint: disable=consider-using-f-string
 
+# Row layouts for SoC calculation log, parsed once rather than on every row
+SOC_CALC_ROW = "{:<20} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}".format
+SOC_SUMMARY_ROW = "{:<25} {:>10} {:>10} {:>10} {:>10} {:>10}".format
+
+# Valid inverter commands from settings, indexed by register id
+GE_CMD_BY_ID = {line['id']: line for line in stgs.GE_Command_list['data']}
+
+# Period (s) for which a register value confirmed by readback is trusted without rewriting it
+REG_CACHE_TTL = 3600
+
 class GivEnergyObj:
     """Class for GivEnergy inverter"""
 
@@ -70,16 +87,20 @@ class GivEnergyObj:
                     'inverter': {'temperature': 0, 'power': 0, 'output_voltage': 0, \
                         'output_frequency': 0, 'eps_power': 0},
                     'consumption': 0}
-        self.sys_status: List[str] = [sys_item] * 5
+        self.sys_status: Deque[dict] = deque([sys_item] * 5, maxlen=5)  # Newest first
 
         meter_item = {'time': '',
                       'today': {'solar': 0, 'grid': {'import': 0, 'export': 0},
                                 'battery': {'charge': 0, 'discharge': 0}, 'consumption': 0},
                       'total': {'solar': 0, 'grid': {'import': 0, 'export': 0},
                                 'battery': {'charge': 0, 'discharge': 0}, 'consumption': 0}}
-        self.meter_status: List[str] = [meter_item] * 5
+        self.meter_status: Deque[dict] = deque([meter_item] * 5, maxlen=5)  # Newest first
 
+        # Each status history is filled from its own first good reading
+        self.sys_packed: bool = False
+        self.meter_packed: bool = False
         self.read_time_mins: int = -100
+        self.meter_read_mins: int = -100
         self.line_voltage: float = 0
         self.grid_power: int = 0
         self.grid_energy: int = 0
@@ -88,53 +109,69 @@ class GivEnergyObj:
         self.batt_power: int = 0
         self.consumption: int = 0
         self.soc: int = 0
-        self.base_load = stgs.GE.base_load
+        self.base_load = array('d', stgs.GE.base_load)  # Packed half-hourly load (kWh)
         self.tgt_soc: int = 100
         self.cmd_list = stgs.GE_Command_list['data']
-        self.plot = [""] * 5
+        self.plot = [""] * 5  # SoC chart rows, lists once calculated. Formatted when logged
+
+        # Last register values confirmed by readback: register -> (value, monotonic time)
+        self.reg_cache: dict = {}
+
+        # Persistent HTTP session for GivEnergy API calls. Keeps the TLS connection alive between
+        # requests; requests negotiates gzip compression of responses by default. Requests that
+        # get a rate-limit or server error response are retried with backoff. This includes
+        # POSTs, as register writes set an absolute value and can safely be repeated. Retry-After
+        # is ignored, and connection failures and timeouts are not retried, so that a call never
+        # takes much longer than its timeout and cannot stall the main loop
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': 'Bearer  ' + stgs.GE.key,
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        })
+        retries = Retry(total=3, connect=0, read=0, other=0, status=3, backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET", "POST"],
+            respect_retry_after_header=False)
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4,
+            max_retries=retries))
 
         logger.debug("Valid inverter commands:")
         for line in self.cmd_list:
-            logger.debug(str(line['id'])+ "- "+ str(line['name']))
+            logger.debug("%s- %s", line['id'], line['name'])
 
     def get_latest_data(self):
         """Download latest data from GivEnergy."""
 
-        utc_timenow_mins = t_to_mins(time.strftime("%H:%M:%S", time.gmtime()))
-        if (utc_timenow_mins > self.read_time_mins + 5 or
-            utc_timenow_mins < self.read_time_mins):  # Update every 5 minutes plus day rollover
+        utc_timenow = time.gmtime()
+        utc_timenow_mins = utc_timenow.tm_hour * 60 + utc_timenow.tm_min
 
+        # Update every 5 minutes plus day rollover. Each endpoint is throttled on its own last
+        # good read, so a failure of one neither holds up nor speeds up polling of the other
+        sys_due = (utc_timenow_mins > self.read_time_mins + 5 or
+            utc_timenow_mins < self.read_time_mins)
+        meter_due = (utc_timenow_mins > self.meter_read_mins + 5 or
+            utc_timenow_mins < self.meter_read_mins)
+
+        if sys_due:
             url = stgs.GE.url + "system-data/latest"
-            key = stgs.GE.key
-            headers = {
-                'Authorization': 'Bearer  ' + key,
-                'Content-Type': 'application/json',
-                'Accept': 'application/json'
-            }
 
             try:
-                resp = requests.request('GET', url, headers=headers, timeout=10)
+                resp = self.session.get(url, timeout=10)
             except requests.exceptions.RequestException as error:
                 logger.error(error)
-                return
-
-            if len(resp.content) > 100:
-                for i in range(4, -1, -1):  # Right shift old data
-                    if i > 0:
-                        self.sys_status[i] = self.sys_status[i - 1]
-                    else:
-                        try:
-                            self.sys_status[i] = \
-                                json.loads(resp.content.decode('utf-8'))['data']
-                        except Exception:
-                            logger.error("Error reading GivEnergy sys status "+ stgs.pg.t_now)
-                            logger.error(resp.content)
-                            self.sys_status[i] = self.sys_status[i + 1]
-                if stgs.pg.loop_counter == 0:  # Pack array on startup
-                    i = 1
-                    while i < 5:
-                        self.sys_status[i] = self.sys_status[0]
-                        i += 1
+                resp = None
+
+            if resp is not None and len(resp.content) > 100:
+                try:  # Add latest data, oldest drops off the end
+                    self.sys_status.appendleft(resp.json()['data'])
+                except (ValueError, KeyError, TypeError):
+                    logger.error("Error reading GivEnergy sys status "+ stgs.pg.t_now)
+                    logger.error(resp.content)
+                    self.sys_status.appendleft(self.sys_status[0])
+                else:
+                    if not self.sys_packed:  # Pack array on startup
+                        self.sys_status = deque([self.sys_status[0]] * 5, maxlen=5)
+                        self.sys_packed = True
 
                 self.read_time_mins = t_to_mins(self.sys_status[0]['time'][11:])
                 # Check for BST and convert to local time
@@ -148,35 +185,33 @@ class GivEnergyObj:
                 self.consumption = int(self.sys_status[0]['consumption'])
                 self.soc = int(self.sys_status[0]['battery']['percent'])
 
+        if meter_due:
             url = stgs.GE.url + "meter-data/latest"
             try:
-                resp = requests.request('GET', url, headers=headers, timeout=10)
+                resp = self.session.get(url, timeout=10)
             except requests.exceptions.RequestException as error:
                 logger.error(error)
                 return
 
             if len(resp.content) > 100:
-                for i in range(4, -1, -1):  # Right shift old data
-                    if i > 0:
-                        self.meter_status[i] = self.meter_status[i - 1]
-                    else:
-                        try:
-                            self.meter_status[i] = \
-                                json.loads(resp.content.decode('utf-8'))['data']
-                        except Exception:
-                            logger.error("Error reading GivEnergy meter status "+ stgs.pg.t_now)
-                            logger.error(resp.content)
-                            self.meter_status[i] = self.meter_status[i + 1]
-                if stgs.pg.loop_counter == 0:  # Pack array on startup
-                    i = 1
-                    while i < 5:
-                        self.meter_status[i] = self.meter_status[0]
-                        i += 1
-
-                self.pv_energy = int(self.meter_status[0]['today']['solar'] * 1000)
+                try:  # Add latest data, oldest drops off the end
+                    self.meter_status.appendleft(resp.json()['data'])
+                except (ValueError, KeyError, TypeError):
+                    logger.error("Error reading GivEnergy meter status "+ stgs.pg.t_now)
+                    logger.error(resp.content)
+                    self.meter_status.appendleft(self.meter_status[0])
+                else:
+                    if not self.meter_packed:  # Pack array on startup
+                        self.meter_status = deque([self.meter_status[0]] * 5, maxlen=5)
+                        self.meter_packed = True
+                    self.meter_read_mins = utc_timenow_mins  # UTC, unlike read_time_mins
+
+                # Energy totals (kWh) are rounded to the nearest Wh, not truncated
+                self.pv_energy = round(self.meter_status[0]['today']['solar'] * 1000)
 
                 # Daily grid energy must be >=0 for PVOutput.org (battery charge >= midnight value)
-                self.grid_energy = max(int(self.meter_status[0]['today']['consumption'] * 1000), 0)
+                self.grid_energy = max(round(self.meter_status[0]['today']['consumption'] * 1000),
+                    0)
 
     def get_load_hist(self):
         """Download historical consumption data from GivEnergy and pack array for next SoC calc"""
@@ -188,19 +223,14 @@ class GivEnergyObj:
             day_delta = offset if (stgs.pg.t_now_mins > 1260) else offset + 1  # Today if >9pm
             day = datetime.strftime(datetime.now() - timedelta(day_delta), '%Y-%m-%d')
             url = stgs.GE.url + "data-points/"+ day
-            key = stgs.GE.key
-            headers = {
-                'Authorization': 'Bearer  ' + key,
-                'Content-Type': 'application/json',
-                'Accept': 'application/json'
-            }
+            # Only the first 290 records (5-minute samples up to midnight) are used below
             params = {
                 'page': '1',
-                'pageSize': '2000'
+                'pageSize': '290'
             }
 
             try:
-                resp = requests.request('GET', url, headers=headers, params=params, timeout=10)
+                resp = self.session.get(url, params=params, timeout=10)
             except requests.exceptions.RequestException as error:
                 logger.error(error)
                 return load_array
@@ -209,166 +239,161 @@ class GivEnergyObj:
                 return load_array
 
             if len(resp.content) > 100:
-                history = json.loads(resp.content.decode('utf-8'))
-                i = 6
-                counter = 0
-                current_energy = prev_energy = 0
-                while i < 290:
+                history = json.loads(resp.content)
+
+                # Cumulative consumption at the end of each half-hour (every 6th 5-minute
+                # sample), stopping at the first missing record
+                energy = [0.0]
+                for record in history.get('data', [])[6:290:6]:
                     try:
-                        current_energy = float(history['data'][i]['today']['consumption'])
-                    except Exception:
+                        energy.append(float(record['today']['consumption']))
+                    except (KeyError, TypeError, ValueError):
                         break
-                    if counter == 0:
-                        load_array[counter] = round(current_energy, 1)
-                    else:
-                        load_array[counter] = round(current_energy - prev_energy, 1)
-                    counter += 1
-                    prev_energy = current_energy
-                    i += 6
+
+                # Consumption in each half-hour is the difference between consecutive totals
+                load_array[0:len(energy) - 1] = [current_energy - prev_energy
+                    for prev_energy, current_energy in zip(energy, energy[1:])]
             return load_array
 
-        load_hist_array = [0] * 48
-        acc_load = [0] * 48
-        total_weight: float = 0
-
-        i: int = 0
-        while i < len(stgs.GE.load_hist_weight):
-            if stgs.GE.load_hist_weight[i] > 0:
-                logger.debug("Processing load history for day -"+ str(i + 1))
-                load_hist_array = get_load_hist_day(i)
-                j = 0
-                while j < 48:
-                    acc_load[j] += load_hist_array[j] * stgs.GE.load_hist_weight[i]
-                    acc_load[j] = round(acc_load[j], 2)
-                    j += 1
-                total_weight += stgs.GE.load_hist_weight[i]
-                logger.debug(str(acc_load)+ " total weight: "+ str(total_weight))
+        load_hist_weight = stgs.GE.load_hist_weight
+
+        # Download history for all weighted days at once (up to the session's pool size)
+        days = [day for day, weight in enumerate(load_hist_weight) if weight > 0]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            load_hist = dict(zip(days, executor.map(get_load_hist_day, days)))
+
+        # Weight and half-hourly consumption for each day of history used
+        weighted_hist = []
+        for day, weight in enumerate(load_hist_weight):
+            if weight > 0:
+                logger.debug("Processing load history for day -%d", day + 1)
+                load_hist_array = load_hist[day]
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(str([round(load, 2) for load in load_hist_array])+ " weight: "+
+                        str(weight))
+                weighted_hist.append((weight, load_hist_array))
             else:
-                logger.debug("Skipping load history for day -"+ str(i + 1)+ " (weight <= 0)")
-            i += 1
+                logger.debug("Skipping load history for day -%d (weight <= 0)", day + 1)
+        total_weight = sum(weight for weight, _ in weighted_hist)
 
         # Avoid DIV/0 if config file contains incorrect weightings
         if total_weight == 0:
             logger.error("Configuration error: incorrect daily weightings")
             total_weight = 1
 
-        # Calculate averages and write results
-        i = 0
-        while i < 48:
-            self.base_load[i] = round(acc_load[i]/total_weight, 1)
-            i += 1
-        logger.debug("Load Calc Summary: "+ str(self.base_load))
+        # Weighted average for each half-hour slot, computed in one pass over the history.
+        # Rounding is applied once, here
+        self.base_load = array('d', (round(sum(weight * load_hist_array[slot] for weight,
+            load_hist_array in weighted_hist) / total_weight, 1) for slot in range(48)))
+        logger.debug("Load Calc Summary: %s", self.base_load.tolist())
 
     def set_mode(self, cmd: str):
         """Configures inverter operating mode"""
 
-        def set_inverter_register(register: str, value: str):
-            """Exactly as it says"""
+        def set_inverter_register(register: str, value: str) -> bool:
+            """Exactly as it says. Returns True if the write was made and accepted"""
 
             # Validate command against list in settings
-            cmd_name = ""
-            valid_cmd = False
-            for line in self.cmd_list:
-                if line['id'] == int(register):
-                    cmd_name = line['name']
-                    valid_cmd = True
-                    break
-
-            if valid_cmd is False:
+            if int(register) not in GE_CMD_BY_ID:
                 logger.critical("write attempt to invalid inverter register: "+ str(register))
-                return
+                return False
+            cmd_name = GE_CMD_BY_ID[int(register)]['name']
+
+            # Skip the write (and readback) if the inverter was recently confirmed to hold value
+            cached = self.reg_cache.get(register)
+            if cached is not None and cached[0] == str(value) and \
+                time.monotonic() - cached[1] < REG_CACHE_TTL:
+                logger.debug("Register %s (%s) already %s, write skipped", register, cmd_name,
+                    value)
+                return False
 
             url = stgs.GE.url + "settings/"+ register + "/write"
-            key = stgs.GE.key
-            headers = {
-                'Authorization': 'Bearer  ' + key,
-                'Content-Type': 'application/json',
-                'Accept': 'application/json'
-            }
             payload = {
                 'value': value
             }
             resp = "TEST"
             if not stgs.pg.test_mode:
                 try:
-                    resp = requests.request('POST', url, headers=headers, json=payload, timeout=10)
+                    resp = self.session.post(url, json=payload, timeout=10)
                 except requests.exceptions.RequestException as error:
                     logger.error(error)
-                    return
+                    return False
                 if resp.status_code != 201:
                     logger.info("Invalid response: "+ str(resp.status_code))
-                    return
+                    return False
 
             logger.info("Setting Register "+ str(register)+ " ("+ str(cmd_name) + ") to "+
                         str(value)+ "   Response: "+ str(resp))
+            return True
 
-            time.sleep(3)  # Allow data on GE server to settle
+        def check_inverter_register(register: str, value: str):
+            """Read back register and check that it holds the value written"""
 
-            # Readback check
             url = stgs.GE.url + "settings/"+ register + "/read"
-            key = stgs.GE.key
-            headers = {
-                'Authorization': 'Bearer  ' + key,
-                'Content-Type': 'application/json',
-                'Accept': 'application/json'
-            }
             payload = {}
 
             try:
-                resp = requests.request('POST', url, headers=headers, json=payload, timeout=10)
-            except resp.exceptions.RequestException as error:
+                resp = self.session.post(url, json=payload, timeout=10)
+            except requests.exceptions.RequestException as error:
                 logger.error(error)
                 return
             if resp.status_code != 201:
                 logger.error("Invalid response: "+ str(resp.status_code))
                 return
 
-            returned_cmd = json.loads(resp.content.decode('utf-8'))['data']['value']
+            returned_cmd = resp.json()['data']['value']
             if str(returned_cmd) == str(value):
                 logger.info("Successful register read: "+ str(register)+ " = "+ str(returned_cmd))
+                self.reg_cache[register] = (str(value), time.monotonic())
             else:
+                self.reg_cache.pop(register, None)
                 logger.error("Readback failed on GivEnergy API... Expected " +
                     str(value) + ", Read: "+ str(returned_cmd))
 
+        def set_inverter_registers(settings: List[Tuple[str, str]]):
+            """Write a group of registers, then read them all back after one settling delay"""
+
+            written = [(register, value) for register, value in settings
+                if set_inverter_register(register, value)]
+            if written:
+                time.sleep(3)  # Allow data on GE server to settle
+                for register, value in written:
+                    check_inverter_register(register, value)
+
         if cmd == "set_soc":  # Sets target SoC to value
-            set_inverter_register("77", str(self.tgt_soc))
+            settings = [("77", str(self.tgt_soc))]
             if stgs.GE.start_time != "":
                 start_time = t_to_hrs(t_to_mins(stgs.GE.start_time))
-                set_inverter_register("64", start_time)
+                settings.append(("64", start_time))
             if stgs.GE.end_time != "":
-                set_inverter_register("65", stgs.GE.end_time)
+                settings.append(("65", stgs.GE.end_time))
+            set_inverter_registers(settings)
 
         elif cmd == "set_soc_winter":  # Restore default overnight charge params
-            set_inverter_register("77", "100")
+            settings = [("77", "100")]
             if stgs.GE.start_time != "":
-                start_time = t_to_hrs(t_to_mins(stgs.GE.start_time))
-                set_inverter_register("64", stgs.GE.start_time)
+                settings.append(("64", stgs.GE.start_time))
             if stgs.GE.end_time_winter != "":
-                set_inverter_register("65", stgs.GE.end_time_winter)
+                settings.append(("65", stgs.GE.end_time_winter))
+            set_inverter_registers(settings)
 
         elif cmd == "charge_now":
-            set_inverter_register("77", "100")
-            set_inverter_register("64", "00:01")
-            set_inverter_register("65", "23:59")
+            set_inverter_registers([("77", "100"), ("64", "00:01"), ("65", "23:59")])
 
         elif cmd == "charge_now_soc":
-            set_inverter_register("77", str(self.tgt_soc))
-            set_inverter_register("64", "00:01")
-            set_inverter_register("65", "23:59")
+            set_inverter_registers([("77", str(self.tgt_soc)), ("64", "00:01"), ("65", "23:59")])
 
         elif cmd == "pause":
-            set_inverter_register("72", "0")
-            set_inverter_register("73", "0")
+            set_inverter_registers([("72", "0"), ("73", "0")])
 
         elif cmd == "pause_charge":
-            set_inverter_register("72", "0")
+            set_inverter_registers([("72", "0")])
 
         elif cmd == "pause_discharge":
-            set_inverter_register("73", "0")
+            set_inverter_registers([("73", "0")])
 
         elif cmd == "resume":
-            set_inverter_register("72", "3000")
-            set_inverter_register("73", "3000")
+            set_inverter_registers([("72", "3000"), ("73", "3000")])
             self.set_mode("set_soc")
 
         elif cmd == "test":
@@ -387,7 +412,7 @@ class GivEnergyObj:
             return "set_soc_winter"
 
         # Quick check for valid generation data
-        if gen_fcast.pv_est50_day[0] == 0:
+        if gen_fcast.pv_est50_day[0] <= 0:
             logger.error("Missing generation data, SoC set to 100")
             self.tgt_soc = 100
             return "set_soc"
@@ -405,50 +430,57 @@ class GivEnergyObj:
         wgt_90 = max(0, weight - 50)
 
         logger.info("")
-        logger.info("{:<20} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}".\
-            format("SoC Calc;", "Day", "Hour", "Charge", "Cons", "Gen", "SoC", "Min", "Max"))
-
-        # Definitions for export of SoC forecast in chart form
-        tgt_time = ["Time"]
-        tgt_soc_raw = ["Calculated SoC"]
-        tgt_soc_adj = ["Adjusted SoC"]
-        tgt_max_line = ["Max"]
-        tgt_rsv_line = ["Reserve"]
+        logger.info(SOC_CALC_ROW("SoC Calc;", "Day", "Hour", "Charge", "Cons", "Gen", "SoC",
+            "Min", "Max"))
 
         if stgs.GE.end_time != "":
             end_charge_period = int(stgs.GE.end_time[0:2]) * 2
         else:
             end_charge_period = 8
 
+        # Settings used inside the loops below, bound to locals once
         batt_max_charge: float = stgs.GE.batt_max_charge
-        batt_charge: float = [0] * 98
-        reserve_energy = batt_max_charge * stgs.GE.batt_reserve / 100
+        batt_reserve: int = stgs.GE.batt_reserve
+        charge_rate: float = stgs.GE.charge_rate
+        base_load = self.base_load
+
+        # Definitions for export of SoC forecast in chart form. Rows are a header followed by
+        # one value for each of the 96 slots; fixed rows are built whole
+        tgt_time = ["Time"] + [t_to_hrs(slot * 30) for slot in range(96)]
+        tgt_soc_raw = ["Calculated SoC"] + [0] * 96
+        tgt_soc_adj = ["Adjusted SoC"]
+        tgt_max_line = ["Max"] + [100] * 96  # Upper limit line for chart readability
+        tgt_rsv_line = ["Reserve"] + [batt_reserve] * 96  # Lower limit line
+
+        reserve_energy = batt_max_charge * batt_reserve / 100
         max_charge_pcnt = [0] * 2
         min_charge_pcnt = [0] * 2
 
+        # Weighted generation estimate for each 30-minute slot, computed once for both days
+        wgt_sum = wgt_10 + wgt_50 + wgt_90
+        est_gen_30 = [(pv_10 * wgt_10 + pv_50 * wgt_50 + pv_90 * wgt_90) / wgt_sum
+            for pv_10, pv_50, pv_90 in zip(gen_fcast.pv_est10_30, gen_fcast.pv_est50_30,
+            gen_fcast.pv_est90_30)]
+
+        # Simulate battery charge for each day, each starting from the reserve value
+        batt_charge_day = [simulate_batt_charge(est_gen_30[day*48:day*48 + 48], base_load,
+            end_charge_period, reserve_energy, charge_rate) for day in range(2)]
+
         # The clever bit:
         # Start with battery at reserve %. For each 30-minute slot of the coming day, calculate
         # the battery charge based on forecast generation and historical usage. Capture values
         # for maximum charge and also the minimum charge that occurs before the maximum.
 
+        # Running min and max charge at each slot, kept for the log below
+        min_charge_slot = []
+        max_charge_slot = []
+
         day = 0
         while day < 2:  # Repeat for tomorrow and next day
-            batt_charge[0] = max_charge = min_charge = reserve_energy
-            est_gen = 0
+            batt_charge = batt_charge_day[day]
+            max_charge = min_charge = reserve_energy
             i = 0
             while i < 48:
-                if i <= end_charge_period:  # Battery is in AC Charge mode
-                    total_load = 0
-                    batt_charge[i] = batt_charge[0]
-                else:
-                    total_load = self.base_load[i]
-                    est_gen = (gen_fcast.pv_est10_30[day*48 + i] * wgt_10 +
-                        gen_fcast.pv_est50_30[day*48 + i] * wgt_50 +
-                        gen_fcast.pv_est90_30[day*48 + i] * wgt_90) / (wgt_10 + wgt_50 + wgt_90)
-                    batt_charge[i] = (batt_charge[i - 1] +
-                        max(-1 * stgs.GE.charge_rate,
-                        min(stgs.GE.charge_rate, (est_gen - total_load))))
-
                 # Forward pass: Capture min charge before charge exceeds overnight value
                 # and max charge during the day.
                 # At this point in the code, min_charge is the last minimum before the charge
@@ -457,43 +489,46 @@ class GivEnergyObj:
                     min_charge = min(min_charge, batt_charge[i])
                 elif i > end_charge_period:  # Charging after overnight boost
                     max_charge = max(max_charge, batt_charge[i])
+                min_charge_slot.append(min_charge)
+                max_charge_slot.append(max_charge)
 
-                logger.info("{:<20} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}".\
-                    format("SoC Calc;", \
-                        day, t_to_hrs(i * 30), \
-                        round(batt_charge[i], 2), \
-                        round(total_load, 2), round(est_gen, 2), \
-                        int(100 * batt_charge[i] / batt_max_charge), \
-                        int(100 * min_charge/batt_max_charge), \
-                        int(100 * max_charge/batt_max_charge)))
-
-                # These arrays are used for the second pass and to plot the workings (if needed)
-                tgt_time.append(t_to_hrs((day*48 + i) * 30))  # Time
-                tgt_soc_raw.append(int(100 * batt_charge[i]/batt_max_charge))  # Baseline SoC line
-                tgt_max_line.append(100)  # Upper limit line for chart readability
-                tgt_rsv_line.append(stgs.GE.batt_reserve)  # Lower limit line
+                # Baseline SoC, used for the second pass and to plot the workings (if needed)
+                tgt_soc_raw[day*48 + i + 1] = int(100 * batt_charge[i]/batt_max_charge)
 
                 i += 1
 
             max_charge_pcnt[day] = int(100 * max_charge / batt_max_charge)
             min_charge_pcnt[day] = int(100 * min_charge / batt_max_charge)
 
-            day += 1
+            # Backward pass. The min charge value above is the first of the day, there may be
+            # others. Search the SoC data from the (last) max point backwards to find the true
+            # minimum. The final slot of the day is not searched
+            day_soc = tgt_soc_raw[day*48 + 1:day*48 + 48]
+            if max_charge_pcnt[day] in day_soc:
+                max_slot = len(day_soc) - 1 - day_soc[::-1].index(max_charge_pcnt[day])
+                min_charge_pcnt[day] = min(min_charge_pcnt[day], min(day_soc[:max_slot + 1]))
 
-        # Backward pass. The min charge value above is the first of the day, there may be others
-        # Search the SoC data from the max point backwards to find the true minimum
-        day = 0
-        while day < 2:  # Repeat for tomorrow and next day
-            i = 47 + day * 48
-            search_window = False
-            while i > day * 48:
-                if int(tgt_soc_raw[i]) == int(max_charge_pcnt[day]):
-                    search_window = True
-                if search_window:
-                    min_charge_pcnt[day] = min(int(min_charge_pcnt[day]), int(tgt_soc_raw[i]))
-                i -= 1
             day += 1
 
+        # Log the workings for each slot, separately from the calculation above. Skipped
+        # entirely (no formatting) if the log level filters it out
+        if logger.isEnabledFor(logging.INFO):
+            for slot in range(96):
+                day, i = divmod(slot, 48)
+                if i <= end_charge_period:  # Battery is in AC Charge mode
+                    total_load = 0
+                    est_gen = 0
+                else:
+                    total_load = base_load[i]
+                    est_gen = est_gen_30[slot]
+                logger.info(SOC_CALC_ROW("SoC Calc;", \
+                        day, t_to_hrs(i * 30), \
+                        round(batt_charge_day[day][i], 2), \
+                        round(total_load, 2), round(est_gen, 2), \
+                        int(100 * batt_charge_day[day][i] / batt_max_charge), \
+                        int(100 * min_charge_slot[slot]/batt_max_charge), \
+                        int(100 * max_charge_slot[slot]/batt_max_charge)))
+
         logger.info("SoC Calc; Min (day 0, day 1) = "+\
             str(min_charge_pcnt[0])+ ", "+ str(min_charge_pcnt[1]))
         logger.info("SoC Calc; Max (day 0, day 1) = "+\
@@ -527,33 +562,34 @@ class GivEnergyObj:
         # Range check the resulting value
         tgt_soc = int(min(tgt_soc, 100))  # Limit range to 100%
 
-        # Produce plot of adjusted SoC
-        day = 0
-        diff = tgt_soc
-        while day < 2:
-            i = 0
-            while i < 48:
-                if day == 1 and i == 0:
-                    diff = tgt_soc_adj[48] - tgt_soc_raw[49]
-                if tgt_soc_raw[day*48 + i + 1] + diff > 100:  # Correct for SoC > 100%
-                    diff = 100 - tgt_soc_raw[day*48 + i + 1]  # Bugfix v1.1.0a
-                tgt_soc_adj.append(tgt_soc_raw[day*48 + i + 1] + diff)
-                i += 1
-            day += 1
-
-        # Store plot data
-        self.plot[0] = str(tgt_time)
-        self.plot[1] = str(tgt_soc_raw)
-        self.plot[2] = str(tgt_soc_adj)
-        self.plot[3] = str(tgt_max_line)
-        self.plot[4] = str(tgt_rsv_line)
-
-        logger.info("{:<25} {:>10} {:>10} {:>10} {:>10} {:>10}".format("SoC Calc Summary;",
+        # Produce and store plot of adjusted SoC. Only needed if the result is used
+        if commit:
+            day = 0
+            diff = tgt_soc
+            while day < 2:
+                i = 0
+                while i < 48:
+                    if day == 1 and i == 0:
+                        diff = tgt_soc_adj[48] - tgt_soc_raw[49]
+                    if tgt_soc_raw[day*48 + i + 1] + diff > 100:  # Correct for SoC > 100%
+                        diff = 100 - tgt_soc_raw[day*48 + i + 1]  # Bugfix v1.1.0a
+                    tgt_soc_adj.append(tgt_soc_raw[day*48 + i + 1] + diff)
+                    i += 1
+                day += 1
+
+            # Store plot data
+            self.plot[0] = tgt_time
+            self.plot[1] = tgt_soc_raw
+            self.plot[2] = tgt_soc_adj
+            self.plot[3] = tgt_max_line
+            self.plot[4] = tgt_rsv_line
+
+        logger.info(SOC_SUMMARY_ROW("SoC Calc Summary;",
             "Max Charge", "Min Charge", "Max %", "Min %", "Target SoC"))
-        logger.info("{:<25} {:>10} {:>10} {:>10} {:>10} {:>10}".format("SoC Calc Summary;",
+        logger.info(SOC_SUMMARY_ROW("SoC Calc Summary;",
             round(max_charge, 2), round(min_charge, 2),
             max_charge_pcnt[0], min_charge_pcnt[0], "N/A"))
-        logger.info("{:<25} {:>10} {:>10} {:>10} {:>10} {:>10}".format("SoC (Adjusted);",
+        logger.info(SOC_SUMMARY_ROW("SoC (Adjusted);",
             round(max_charge, 2), round(min_charge, 2),
             max_charge_pc + tgt_soc, min_charge_pc + tgt_soc, tgt_soc))
 
@@ -565,6 +601,19 @@ class GivEnergyObj:
 
 # End of GivEnergyObj() class definition
 
+def simulate_batt_charge(est_gen: List[float], base_load: List[float], end_charge_period: int,
+    start_charge: float, charge_rate: float) -> List[float]:
+    """Battery charge (kWh) at each 30-minute slot of a day, from generation and load"""
+
+    # Battery is in AC Charge mode up to the end of the charge period, after which the
+    # charge is a running sum of net generation, limited by the inverter charge rate.
+    return [start_charge] * end_charge_period + list(accumulate(
+        (max(-1 * charge_rate, min(charge_rate, (gen - load)))
+        for gen, load in zip(est_gen[end_charge_period + 1:48],
+        base_load[end_charge_period + 1:48])), initial=start_charge))
+
+#  End of simulate_batt_charge()
+
 class SolcastObj:
     """Stores daily Solcast data."""
 
@@ -578,19 +627,58 @@ class SolcastObj:
         self.pv_est50_30: [int] = [0] * 96
         self.pv_est90_30: [int] = [0] * 96
 
-    def update(self):
-        """Updates forecast generation from Solcast."""
+        # Start (mins) of the summaries above within the per-minute forecast, set by update()
+        self.offset: int = 0
+
+        # Keep-alive session shared by the downloads for both arrays. Server error responses
+        # are retried with a short backoff. Rate-limit responses (429) are not retried, as they
+        # mean the daily quota is used up. Retry-After is ignored and connection failures and
+        # timeouts are not retried, so as not to stall the caller
+        self.session = requests.Session()
+        retries = Retry(total=3, connect=0, read=0, other=0, status=3, backoff_factor=0.5,
+            status_forcelist=[500, 502, 503, 504], respect_retry_after_header=False)
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2,
+            max_retries=retries))
+
+        # Validators and last good response for each array, used for conditional downloads
+        self.validators: dict = {}
+        self.solcast_data: dict = {}
+
+    @staticmethod
+    def summary_offset(solcast_offset: int) -> int:
+        """Start of summaries within per-minute forecast, given start time of forecast data"""
+
+        if solcast_offset > 720:  # Forget about current day as it's already afternoon
+            return 1440 - 90
+        return 0
+
+    @staticmethod
+    def current_offset() -> int:
+        """Summary offset that a forecast downloaded now would have"""
+
+        # Forecast data starts with the current 30-minute period. As in update(), its start
+        # time is local time less one hour
+        local_now = time.localtime()
+        period_start = (local_now.tm_hour * 60 + local_now.tm_min) // 30 * 30
+        return SolcastObj.summary_offset(period_start - 60)
+
+    def update(self) -> bool:
+        """Updates forecast generation from Solcast. Returns False if download failed."""
 
         def get_solcast(url) -> Tuple[bool, str]:
             """Download latest Solcast forecast."""
 
             solcast_url = url + stgs.Solcast.cmd + "&api_key="+ stgs.Solcast.key
             try:
-                resp = requests.get(solcast_url, timeout=5)
+                resp = self.session.get(solcast_url, headers=self.validators.get(url, {}),
+                    timeout=5)
                 resp.raise_for_status()
             except requests.exceptions.RequestException as error:
                 logger.error(error)
                 return False, ""
+            if resp.status_code == 304 and url in self.solcast_data:
+                logger.info("Solcast forecast unchanged, using previous download")
+                return True, self.solcast_data[url]
             if resp.status_code != 200:
                 logger.error("Invalid response: "+ str(resp.status_code))
                 return False, ""
@@ -600,39 +688,70 @@ class SolcastObj:
                 logger.warning(resp.content)
                 return False, ""
 
-            solcast_data = json.loads(resp.content.decode('utf-8'))
-            logger.debug(str(solcast_data))
+            solcast_data = json.loads(resp.content)
+            logger.debug("%s", solcast_data)
+
+            # Keep ETag/Last-Modified so that an unchanged forecast is not downloaded again
+            validators = {}
+            if 'ETag' in resp.headers:
+                validators['If-None-Match'] = resp.headers['ETag']
+            if 'Last-Modified' in resp.headers:
+                validators['If-Modified-Since'] = resp.headers['Last-Modified']
+            if validators:
+                self.validators[url] = validators
+                self.solcast_data[url] = solcast_data
 
             return True, solcast_data
         #  End of get_solcast()
 
-        # Download latest data for each array, abort if unsuccessful
-        result, solcast_data_1 = get_solcast(stgs.Solcast.url_se)
-        if not result:
-            logger.warning("Error; Problem with Solcast data, using previous values (if any)")
-            return
+        def forecast_columns(solcast_data) -> Tuple[List[int], List[int], List[int]]:
+            """Extract P10, P50 and P90 estimates (W) from forecast records, one list each"""
+
+            forecasts = solcast_data['forecasts']
+            return ([int(line['pv_estimate10'] * 1000) for line in forecasts],
+                [int(line['pv_estimate'] * 1000) for line in forecasts],
+                [int(line['pv_estimate90'] * 1000) for line in forecasts])
+        #  End of forecast_columns()
 
+        # Download latest data for each array, abort if unsuccessful. Where two arrays are
+        # specified, both downloads are made at the same time
         if stgs.Solcast.url_sw != "":  # Two arrays are specified
             logger.info("url_sw = '"+str(stgs.Solcast.url_sw)+"'")
-            result, solcast_data_2 = get_solcast(stgs.Solcast.url_sw)
-            if not result:
-                logger.warning("Error; Problem with Solcast data, using previous values (if any)")
-                return
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                download_2 = executor.submit(get_solcast, stgs.Solcast.url_sw)
+                result, solcast_data_1 = get_solcast(stgs.Solcast.url_se)
+                result_2, solcast_data_2 = download_2.result()
+            result = result and result_2
         else:
             logger.info("No second array")
+            result, solcast_data_1 = get_solcast(stgs.Solcast.url_se)
 
-        logger.info("Successful Solcast download.")
+        if not result:
+            logger.warning("Error; Problem with Solcast data, using previous values (if any)")
+            return False
 
-        # Combine forecast for PV arrays & align data with day boundaries
-        pv_est10 = [0] * 10080
-        pv_est50 = [0] * 10080
-        pv_est90 = [0] * 10080
+        logger.info("Successful Solcast download.")
 
-        if stgs.Solcast.url_sw != "":  # Two arrays are specified
-            forecast_lines = min(len(solcast_data_1['forecasts']), \
-                len(solcast_data_2['forecasts'])) - 1
-        else:
-            forecast_lines = len(solcast_data_1['forecasts']) - 1
+        # Convert forecast records to columns once, rather than per minute below, and
+        # combine forecast for PV arrays at forecast resolution before expanding to minutes
+        try:
+            est10, est50, est90 = forecast_columns(solcast_data_1)
+            if stgs.Solcast.url_sw != "":  # Two arrays are specified
+                est10_2, est50_2, est90_2 = forecast_columns(solcast_data_2)
+                est10 = [est_1 + est_2 for est_1, est_2 in zip(est10, est10_2)]
+                est50 = [est_1 + est_2 for est_1, est_2 in zip(est50, est50_2)]
+                est90 = [est_1 + est_2 for est_1, est_2 in zip(est90, est90_2)]
+        except (KeyError, TypeError) as error:
+            logger.error("Error: Unexpected Solcast data format: "+ str(error))
+            return False
+
+        # Align data with day boundaries
+        # Per-minute values (one week) are held as packed machine integers, not Python ints
+        pv_est10 = array('i', [0]) * 10080
+        pv_est50 = array('i', [0]) * 10080
+        pv_est90 = array('i', [0]) * 10080
+
+        forecast_lines = len(est50) - 1
         interval = int(solcast_data_1['forecasts'][0]['period'][2:4])
         solcast_offset = t_to_mins(solcast_data_1['forecasts'][0]['period_end'][11:16]) \
             - interval - 60
@@ -642,91 +761,94 @@ class SolcastObj:
             logger.info("Applying BST offset to Solcast data")
             solcast_offset += 60
 
-        i = solcast_offset
+        def fill_minutes(pv_est, first: int, last: int, value: int):
+            """Set pv_est[first:last] to value. Negative minutes wrap to the end of the week"""
+
+            if first < 0:
+                wrap = min(last, 0)
+                pv_est[first + 10080:wrap + 10080] = array('i', [value]) * (wrap - first)
+                first = wrap
+            if first < last:
+                pv_est[first:last] = array('i', [value]) * (last - first)
+        #  End of fill_minutes()
+
+        # Expand to per-minute values, writing each forecast value as one run of minutes.
+        # A run ends on (and includes) the next minute after 00:01 that is a multiple of the
+        # forecast interval
+        start = solcast_offset
+        end = solcast_offset + forecast_lines * interval
         cntr = 0
-        while i < solcast_offset + forecast_lines * interval:
-            try:
-                pv_est10[i] = int(solcast_data_1['forecasts'][cntr]['pv_estimate10'] * 1000)
-                pv_est50[i] = int(solcast_data_1['forecasts'][cntr]['pv_estimate'] * 1000)
-                pv_est90[i] = int(solcast_data_1['forecasts'][cntr]['pv_estimate90'] * 1000)
-            except Exception:
-                logger.error("Error: Unexpected end of Solcast data (array #1). i="+ \
-                    str(i)+ "cntr="+ str(cntr))
+        while start < end:
+            if start >= 10080 or cntr >= len(est50):
+                logger.error("Error: Unexpected end of Solcast data. i="+ \
+                    str(start)+ "cntr="+ str(cntr))
                 break
-
-            if i > 1 and i % interval == 0:
-                cntr += 1
-            i += 1
-
-        if stgs.Solcast.url_sw != "":  # Two arrays are specified
-            i = solcast_offset
-            cntr = 0
-            while i < solcast_offset + forecast_lines * interval:
-                try:
-                    pv_est10[i] += int(solcast_data_2['forecasts'][cntr]['pv_estimate10'] * 1000)
-                    pv_est50[i] += int(solcast_data_2['forecasts'][cntr]['pv_estimate'] * 1000)
-                    pv_est90[i] += int(solcast_data_2['forecasts'][cntr]['pv_estimate90'] * 1000)
-                except Exception:
-                    logger.error("Error: Unexpected end of Solcast data (array #2). i="+ \
-                        str(i)+ "cntr="+ str(cntr))
-                    break
-
-                if i > 1 and i % interval == 0:
-                    cntr += 1
-                i += 1
-
-        if solcast_offset > 720:  # Forget about current day as it's already afternoon
-            offset = 1440 - 90
-        else:
-            offset = 0
-
-        i = 0
-        while i < 7:  # Summarise daily forecasts
-            start = i * 1440 + offset + 1
-            end = start + 1439
-            self.pv_est10_day[i] = round(sum(pv_est10[start:end]) / 60000, 3)
-            self.pv_est50_day[i] = round(sum(pv_est50[start:end]) / 60000, 3)
-            self.pv_est90_day[i] = round(sum(pv_est90[start:end]) / 60000, 3)
-            i += 1
-
-        i = 0
-        while i < 96:  # Calculate half-hourly generation
-            start = i * 30 + offset + 1
-            end = start + 29
-            self.pv_est10_30[i] = round(sum(pv_est10[start:end])/60000, 3)
-            self.pv_est50_30[i] = round(sum(pv_est50[start:end])/60000, 3)
-            self.pv_est90_30[i] = round(sum(pv_est90[start:end])/60000, 3)
-            i += 1
-
-        timestamp = time.strftime("%d-%m-%Y %H:%M:%S", time.localtime())
-        logger.info("PV Estimate 10% (hrly, 7 days) / kWh; "+ timestamp+ "; "+
-            str(self.pv_est10_30[0:47])+ str(self.pv_est10_day[0:6]))
-        logger.info("PV Estimate 50% (hrly, 7 days) / kWh; "+ timestamp+ "; "+
-            str(self.pv_est50_30[0:47])+ str(self.pv_est50_day[0:6]))
-        logger.info("PV Estimate 90% (hrly, 7 days) / kWh; "+ timestamp+ "; "+
-            str(self.pv_est90_30[0:47])+ str(self.pv_est90_day[0:6]))
+            stop = min((max(start, 2) + interval - 1) // interval * interval + 1, end)
+            fill_minutes(pv_est10, start, min(stop, 10080), est10[cntr])
+            fill_minutes(pv_est50, start, min(stop, 10080), est50[cntr])
+            fill_minutes(pv_est90, start, min(stop, 10080), est90[cntr])
+            if stop > 10080:
+                logger.error("Error: Unexpected end of Solcast data. i=10080cntr="+ str(cntr))
+                break
+            cntr += 1
+            start = stop
+
+        offset = self.summary_offset(solcast_offset)
+        self.offset = offset
+
+        # Summarise daily forecasts and calculate half-hourly generation, one estimate at a time.
+        # Daily and half-hourly totals are taken from a running total, built in one pass over
+        # the week
+        for pv_est, pv_est_day, pv_est_30 in ((pv_est10, self.pv_est10_day, self.pv_est10_30),
+            (pv_est50, self.pv_est50_day, self.pv_est50_30),
+            (pv_est90, self.pv_est90_day, self.pv_est90_30)):
+            pv_est_total = list(accumulate(pv_est, initial=0))
+            pv_est_day[:] = [round((pv_est_total[min(start + 1439, 10080)] -
+                pv_est_total[start]) / 60000, 3)
+                for start in range(offset + 1, offset + 1 + 7 * 1440, 1440)]
+            pv_est_30[:] = [round((pv_est_total[start + 29] - pv_est_total[start]) / 60000, 3)
+                for start in range(offset + 1, offset + 1 + 96 * 30, 30)]
+
+        if logger.isEnabledFor(logging.INFO):  # Skip the timestamp if not logged
+            timestamp = time.strftime("%d-%m-%Y %H:%M:%S", time.localtime())
+            logger.info("PV Estimate 10%% (hrly, 7 days) / kWh; %s; %s%s", timestamp,
+                self.pv_est10_30[0:47], self.pv_est10_day[0:6])
+            logger.info("PV Estimate 50%% (hrly, 7 days) / kWh; %s; %s%s", timestamp,
+                self.pv_est50_30[0:47], self.pv_est50_day[0:6])
+            logger.info("PV Estimate 90%% (hrly, 7 days) / kWh; %s; %s%s", timestamp,
+                self.pv_est90_30[0:47], self.pv_est90_day[0:6])
+
+        return True
 
 # End of SolcastObj() class definition
 
+@lru_cache(maxsize=2048)
 def t_to_mins(time_in_hrs: str) -> int:
     """Convert times from HH:MM format to mins after midnight."""
 
-    try:
-        time_in_mins = 60 * int(time_in_hrs[0:2]) + int(time_in_hrs[3:5])
-        return time_in_mins
-    except Exception:
-        return 0
+    # Any trailing seconds or timezone (e.g. "12:34:56Z") are ignored. Returns 0 if malformed
+    hrs = time_in_hrs[0:2]
+    mins = time_in_hrs[3:5]
+    if hrs.isdigit() and mins.isdigit():
+        return 60 * int(hrs) + int(mins)
+    return 0
 
 #  End of t_to_mins()
 
+# HH:MM for each minute of the day, so that t_to_hrs() needs no formatting for these
+HRS_TABLE = tuple(f"{hours:02d}:{mins:02d}" for hours in range(24) for mins in range(60))
+
 def t_to_hrs(time_in: int) -> str:
     """Convert times from mins after midnight format to HH:MM."""
 
+    if isinstance(time_in, int) and 0 <= time_in < 1440:
+        return HRS_TABLE[time_in]
+
+    # Times beyond the current day (e.g. "47:30") or given as floats
     try:
         hours = int(time_in // 60)
         mins = int(time_in - hours * 60)
-        time_in_hrs = '{:02d}{}{:02d}'.format(hours, ":", mins)
-        return time_in_hrs
+        return f"{hours:02d}:{mins:02d}"
     except Exception:
         return "00:00"
 